@@ -1,48 +1,131 @@
-from flask import Flask, request, jsonify
-from flask_cors import CORS
+from typing import Optional
+from fastapi import FastAPI, Response
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 import pandas as pd
+import pyarrow as pa
+import orjson
 import os
 
-app = Flask(__name__)
-CORS(app)
+app = FastAPI(default_response_class=ORJSONResponse)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# Incident listings are large and repetitive JSON, which compresses well
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 # Load the dataset at startup (update path as needed)
 DATA_PATH = os.path.join(os.path.dirname(__file__), '../Incident_Report (1).xlsx')
-df = pd.read_excel(DATA_PATH)
+# Generated per machine, so it lives in the gitignored cache directory
+ARROW_PATH = os.path.join(os.path.dirname(__file__), 'data', 'cache', 'incidents.arrow')
+
+def convert_excel_to_arrow(data):
+    # Written to a temporary file and swapped in, so a worker mapping the
+    # previous copy never sees a partly written file
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    os.makedirs(os.path.dirname(ARROW_PATH), exist_ok=True)
+    tmp_path = ARROW_PATH + '.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, ARROW_PATH)
+
+def arrow_is_current():
+    # The Arrow copy is stale once the workbook has been modified after it
+    if not os.path.exists(ARROW_PATH):
+        return False
+    return not os.path.exists(DATA_PATH) or os.path.getmtime(ARROW_PATH) >= os.path.getmtime(DATA_PATH)
+
+def load_incidents():
+    # Parsing the Excel file is slow, so it is converted once to an
+    # uncompressed Arrow IPC file that later starts memory-map and read
+    # without parsing. Each worker still builds its own DataFrame from it
+    if arrow_is_current():
+        source = pa.memory_map(ARROW_PATH, 'r')
+        return pa.ipc.open_file(source).read_all().to_pandas()
+    data = pd.read_excel(DATA_PATH)
+    try:
+        convert_excel_to_arrow(data)
+    except Exception as e:
+        # Arrow rejects columns that mix numbers and text; serve the Excel data as is
+        print(f"Could not cache dataset as Arrow: {str(e)}")
+    return data
+
+def unique_values(column):
+    # Distinct non-null values in first-seen order
+    return df[column].dropna().unique().tolist()
 
-@app.route('/')
+df = load_incidents()
+
+# Plain JSON-ready rows, decoded once from pandas' own encoding so responses
+# keep the same date/NaN representation while orjson does the per-request work
+RECORDS = orjson.loads(df.to_json(orient='records'))
+
+def find_location_column():
+    # Try common location columns
+    for col in ['Location', 'Area', 'Place', 'Ward']:
+        if col in df.columns:
+            return col
+    return None
+
+# The dataset is read-only after startup, so lookups are computed once per worker
+LOCATION_COLUMN = find_location_column()
+CACHE = {
+    'incident_types': unique_values('Incident Type'),
+    'locations': unique_values(LOCATION_COLUMN) if LOCATION_COLUMN else [],
+}
+
+# Pre-rendered responses for the page sizes clients ask for most
+PAGE_SIZES = (50, 100, 500, 1000)
+CACHE['pages'] = {limit: orjson.dumps(RECORDS[:limit]) for limit in PAGE_SIZES}
+
+# Row positions per incident type, so filtering is a lookup instead of a full scan
+GROUPS = df.groupby('Incident Type').indices
+CACHE['by_type'] = {
+    incident_type: orjson.dumps([RECORDS[i] for i in positions])
+    for incident_type, positions in GROUPS.items()
+}
+
+# Handlers are plain functions: they only read precomputed data, and FastAPI
+# runs them in its thread pool
+
+@app.get('/')
 def index():
-    return jsonify({'status': 'Backend is running'})
+    return {'status': 'Backend is running'}
 
-@app.route('/api/incidents', methods=['GET'])
-def get_incidents():
+@app.get('/api/incidents')
+def get_incidents(limit: int = 100):
     # Return all incidents (limit for safety)
-    limit = int(request.args.get('limit', 100))
-    return df.head(limit).to_json(orient='records')
+    body = CACHE['pages'].get(limit)
+    if body is None:
+        body = orjson.dumps(RECORDS[:limit])
+    return Response(body, media_type='application/json')
 
-@app.route('/api/incident_types', methods=['GET'])
+@app.get('/api/incident_types')
 def get_incident_types():
-    types = df['Incident Type'].dropna().unique().tolist()
-    return jsonify({'incident_types': types})
+    return {'incident_types': CACHE['incident_types']}
 
-@app.route('/api/locations', methods=['GET'])
+@app.get('/api/locations')
 def get_locations():
-    # Try common location columns
-    for col in ['Location', 'Area', 'Place', 'Ward']:
-        if col in df.columns:
-            locations = df[col].dropna().unique().tolist()
-            return jsonify({'locations': locations, 'column': col})
-    return jsonify({'locations': [], 'column': None})
-
-@app.route('/api/incidents_by_type', methods=['GET'])
-def get_incidents_by_type():
-    incident_type = request.args.get('type')
-    if not incident_type:
-        return jsonify({'error': 'Missing type parameter'}), 400
-    filtered = df[df['Incident Type'] == incident_type]
-    return filtered.to_json(orient='records')
+    return {'locations': CACHE['locations'], 'column': LOCATION_COLUMN}
+
+@app.get('/api/incidents_by_type')
+def get_incidents_by_type(type: Optional[str] = None):
+    if not type:
+        return ORJSONResponse({'error': 'Missing type parameter'}, status_code=400)
+    return Response(CACHE['by_type'].get(type, b'[]'), media_type='application/json')
 
 # You can add more endpoints here for analytics, predictions, etc.
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    import sys
+    import uvicorn
+    
+    # uvloop isn't available on Windows; httptools works everywhere
+    loop = "asyncio" if sys.platform == "win32" else "uvloop"
+    uvicorn.run("app:app", host="127.0.0.1", port=5000, reload=True, loop=loop, http="httptools")
@@ -1,17 +1,25 @@
 import os
 import json
+import asyncio
+import threading
+import orjson
 import pandas as pd
+from anyio import to_thread
 from typing import Dict, Any, List, Optional
 from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 from retriever import IncidentRetriever
+from data_preprocessing import compute_incident_stats
 
 # Create FastAPI app
 app = FastAPI(
     title="Mangalore Smart City Incident RAG API",
     description="API for querying incident data using natural language",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -23,6 +31,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger responses such as /stats and query results with long chunk text
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Initialize retriever
 current_dir = os.path.dirname(os.path.abspath(__file__))
 data_dir = os.path.join(os.path.dirname(current_dir), "data")
@@ -30,6 +41,68 @@ vector_store_dir = os.path.join(data_dir, "vector_store")
 
 retriever = None
 
+# /stats is computed once and reused until the processed data file changes
+processed_feather_path = os.path.join(data_dir, "processed_incidents.feather")
+processed_csv_path = os.path.join(data_dir, "processed_incidents.csv")
+stats_path = os.path.join(data_dir, "stats.json")
+STATS_DATE_COLUMNS = ['received_date_time', 'action_date_time', 'closed_at', 'incident_reported_at']
+stats_cache: Dict[str, Any] = {"path": None, "mtime": None, "stats": None}
+stats_lock = threading.Lock()
+
+class QueryBatcher:
+    """
+    Collects concurrent queries for up to max_wait_seconds (or max_batch_size
+    queries) so they share one embedding call and one FAISS search.
+    """
+    
+    def __init__(self, max_batch_size: int = 16, max_wait_seconds: float = 0.01):
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.queue: asyncio.Queue = asyncio.Queue()
+    
+    def start(self):
+        """Start the batching loop on the running event loop"""
+        # Keep a reference so the task isn't garbage collected
+        self.task = asyncio.create_task(self.run())
+    
+    async def submit(self, query: str, k: int):
+        """Queue a query and wait for its (embedding, relevant chunks)"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((query, k, future))
+        return await future
+    
+    async def run(self):
+        """Process queued queries in batches until cancelled"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait_seconds
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            queries = [query for query, _, _ in batch]
+            ks = [k for _, k, _ in batch]
+            try:
+                query_embeddings, chunk_lists = await to_thread.run_sync(retriever.retrieve_batch, queries, ks)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            # Fan results back out to the waiting requests
+            for i, (_, _, future) in enumerate(batch):
+                if not future.done():
+                    future.set_result((query_embeddings[i:i + 1], chunk_lists[i]))
+
+query_batcher = None
+
 # Pydantic models
 class QueryRequest(BaseModel):
     query: str
@@ -46,13 +119,30 @@ class QueryResponse(BaseModel):
 @app.on_event("startup")
 async def startup_event():
     """Initialize resources on startup"""
-    global retriever
+    global retriever, query_batcher
+    
+    # Background task that batches query embedding and index search
+    query_batcher = QueryBatcher()
+    query_batcher.start()
+    
+    # Queries run in worker threads, so allow more of them than anyio's default of 40
+    to_thread.current_default_thread_limiter().total_tokens = 100
+    
     try:
         # Initialize retriever with default model
         retriever = IncidentRetriever(vector_store_dir, model_name="mistral")
-        retriever.load_resources()
+        
+        # Loading the index and models is blocking, so keep it off the event loop
+        await to_thread.run_sync(retriever.load_resources)
     except Exception as e:
         print(f"Error initializing retriever: {str(e)}")
+    
+    # Warm the stats cache so the first request doesn't pay for it; computing them
+    # reads the whole data file, so keep it off the event loop
+    try:
+        await to_thread.run_sync(get_cached_stats)
+    except Exception as e:
+        print(f"Error computing stats: {str(e)}")
 
 @app.get("/")
 async def root():
@@ -80,15 +170,20 @@ async def query(request: QueryRequest):
     if retriever is None:
         raise HTTPException(status_code=503, detail="Retriever not initialized")
     
-    # Update model if different from current
-    if request.model != retriever.model_name:
-        retriever.model_name = request.model
-        retriever.llm = None  # Force reinitialization
-    
-    # Process query
+    # Process query in a worker thread so retrieval and generation don't block the event loop
     start_time = time.time()
     try:
-        response = retriever.process_query(request.query, k=request.num_chunks)
+        # Embedding and index search are batched with other in-flight queries
+        query_embedding, relevant_chunks = await query_batcher.submit(request.query, request.num_chunks)
+        response = await to_thread.run_sync(
+            lambda: retriever.process_query(
+                request.query,
+                k=request.num_chunks,
+                query_embedding=query_embedding,
+                relevant_chunks=relevant_chunks,
+                model=request.model
+            )
+        )
         end_time = time.time()
         
         # Add processing time
@@ -98,6 +193,36 @@ async def query(request: QueryRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest):
+    """
+    Process a natural language query about incidents, streaming the answer as
+    newline-delimited JSON: the relevant chunks first, then one line per token
+    """
+    if retriever is None:
+        raise HTTPException(status_code=503, detail="Retriever not initialized")
+    
+    try:
+        query_embedding, relevant_chunks = await query_batcher.submit(request.query, request.num_chunks)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+    
+    events = retriever.process_query_stream(
+        request.query,
+        k=request.num_chunks,
+        query_embedding=query_embedding,
+        relevant_chunks=relevant_chunks,
+        model=request.model
+    )
+    
+    # The generator blocks on Ollama, so Starlette iterates it in a worker thread.
+    # Marking the body as already encoded keeps GZipMiddleware from buffering tokens
+    return StreamingResponse(
+        (orjson.dumps(event, option=orjson.OPT_APPEND_NEWLINE) for event in events),
+        media_type="application/x-ndjson",
+        headers={"Content-Encoding": "identity"}
+    )
+
 @app.get("/models")
 async def list_models():
     """List available Ollama models"""
@@ -108,65 +233,86 @@ async def list_models():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing models: {str(e)}")
 
+def get_processed_data_path() -> str:
+    """Prefer the Feather export, falling back to the legacy CSV"""
+    if os.path.exists(processed_feather_path):
+        return processed_feather_path
+    return processed_csv_path
+
+def load_processed_data(data_path: str) -> pd.DataFrame:
+    """Load the processed incident data with date columns parsed"""
+    if data_path.endswith('.feather'):
+        # Feather keeps the datetime dtypes written by the preprocessor
+        df = pd.read_feather(data_path)
+        date_columns = [col for col in STATS_DATE_COLUMNS if col in df.columns]
+    else:
+        # Parse date columns while reading so the C parser handles them
+        header = pd.read_csv(data_path, nrows=0).columns
+        date_columns = [col for col in STATS_DATE_COLUMNS if col in header]
+        df = pd.read_csv(data_path, parse_dates=date_columns)
+    
+    # Coerce any column the reader left unparsed because of malformed values
+    for col in date_columns:
+        if not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+    return df
+
+def compute_stats(data_path: str) -> Dict[str, Any]:
+    """Load the processed incident data and compute the /stats payload"""
+    df = load_processed_data(data_path)
+    
+    return compute_incident_stats(df)
+
+def get_cached_stats(recompute: bool = False) -> Dict[str, Any]:
+    """
+    Return cached stats, reloading them when the processed data file changes.
+    
+    Args:
+        recompute (bool): Compute the stats from the data file even if they are
+            cached or a current stats.json exists
+    """
+    data_path = get_processed_data_path()
+    mtime = os.path.getmtime(data_path)
+    
+    # Called from worker threads; the lock keeps concurrent misses from all recomputing
+    with stats_lock:
+        if recompute or stats_cache["stats"] is None or stats_cache["path"] != data_path or stats_cache["mtime"] != mtime:
+            # Use the summary written by preprocessing unless it predates the data
+            if not recompute and os.path.exists(stats_path) and os.path.getmtime(stats_path) >= mtime:
+                with open(stats_path, 'rb') as f:
+                    stats_cache["stats"] = orjson.loads(f.read())
+            else:
+                stats_cache["stats"] = compute_stats(data_path)
+            stats_cache["path"] = data_path
+            stats_cache["mtime"] = mtime
+        return stats_cache["stats"]
+
+# Stats handlers are plain functions so a recompute runs in FastAPI's thread pool
+# instead of blocking the event loop
 @app.get("/stats")
-async def get_stats():
+def get_stats():
     """Get statistics about the incident data"""
     try:
-        # Load processed data
-        csv_path = os.path.join(data_dir, "processed_incidents.csv")
-        
-        # Use pandas for better analysis
-        df = pd.read_csv(csv_path)
-        
-        # Calculate basic stats
-        incident_types = df['incident_type'].value_counts().to_dict()
-        
-        # Get taluk statistics
-        taluk_counts = df['taluk'].value_counts().to_dict()
-        
-        # Get source statistics
-        source_counts = df['info_source'].value_counts().to_dict() if 'info_source' in df.columns else {}
-        
-        # Calculate time-based statistics
-        time_stats = {}
-        
-        # Convert date columns to datetime if they exist
-        date_columns = ['received_date_time', 'action_date_time', 'closed_at', 'incident_reported_at']
-        for col in date_columns:
-            if col in df.columns:
-                df[col] = pd.to_datetime(df[col], errors='coerce')
-        
-        # Get date range
-        if 'received_date_time' in df.columns:
-            time_stats['first_incident'] = df['received_date_time'].min().strftime('%Y-%m-%d') if not pd.isna(df['received_date_time'].min()) else None
-            time_stats['last_incident'] = df['received_date_time'].max().strftime('%Y-%m-%d') if not pd.isna(df['received_date_time'].max()) else None
-        
-        # Calculate average resolution times if available
-        if 'action_time_hours' in df.columns:
-            time_stats['avg_action_time_hours'] = round(df['action_time_hours'].mean(), 2)
-            
-        if 'resolution_time_hours' in df.columns:
-            time_stats['avg_resolution_time_hours'] = round(df['resolution_time_hours'].mean(), 2)
-        
-        # Monthly incident counts if date column exists
-        monthly_counts = {}
-        if 'received_date_time' in df.columns:
-            df['month_year'] = df['received_date_time'].dt.strftime('%Y-%m')
-            monthly_counts = df['month_year'].value_counts().sort_index().to_dict()
-        
-        return {
-            "total_incidents": len(df),
-            "incident_types": incident_types,
-            "taluk_stats": taluk_counts,
-            "source_stats": source_counts,
-            "time_stats": time_stats,
-            "monthly_counts": monthly_counts
-        }
+        return get_cached_stats()
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Error getting stats: {str(e)}")
+
+@app.post("/stats/refresh")
+def refresh_stats():
+    """Recompute the statistics from the processed data file"""
+    try:
+        return get_cached_stats(recompute=True)
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error getting stats: {str(e)}")
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
-    uvicorn.run("api:app", host="0.0.0.0", port=8000, reload=True)
+    
+    # uvloop isn't available on Windows; httptools works everywhere
+    loop = "asyncio" if sys.platform == "win32" else "uvloop"
+    uvicorn.run("api:app", host="0.0.0.0", port=8000, reload=True, loop=loop, http="httptools")
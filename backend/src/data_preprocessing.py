@@ -1,8 +1,83 @@
 import pandas as pd
 import os
 import json
+import orjson
+import pyarrow as pa
+import pyarrow.feather as feather
 from datetime import datetime
 
+# Timestamp format used by the incident export
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Source columns used downstream, by their normalized names
+REQUIRED_COLUMNS = [
+    'sl_no', 'incident_type', 'location', 'taluk', 'received_date_time',
+    'incident_reported_at', 'action_taken_by', 'action_date_time', 'action_remarks',
+    'time_taken_to_take_action', 'closed_by_officer', 'closed_at', 'closed_remarks',
+    'time_taken_to_close', 'info_source', 'info_phone'
+]
+
+# Feather copies of Excel workbooks, so repeated loads skip parsing the workbook
+EXCEL_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'cache')
+
+def normalize_column(col):
+    """Convert a source column name to lowercase with underscores"""
+    return col.lower().replace(' ', '_').replace('.', '').replace('/', '_')
+
+def is_required_column(col):
+    return normalize_column(col) in REQUIRED_COLUMNS
+
+def compute_incident_stats(df):
+    """
+    Compute the incident summary served by the API's /stats endpoint.
+    
+    Args:
+        df (pd.DataFrame): Processed incident data with date columns parsed
+        
+    Returns:
+        dict: Counts by type, taluk, source and month, plus time statistics
+    """
+    # Calculate basic stats
+    incident_types = df['incident_type'].value_counts().to_dict()
+    
+    # Get taluk statistics
+    taluk_counts = df['taluk'].value_counts().to_dict()
+    
+    # Get source statistics
+    source_counts = df['info_source'].value_counts().to_dict() if 'info_source' in df.columns else {}
+    
+    # Calculate time-based statistics
+    time_stats = {}
+    
+    # Get date range
+    if 'received_date_time' in df.columns:
+        time_stats['first_incident'] = df['received_date_time'].min().strftime('%Y-%m-%d') if not pd.isna(df['received_date_time'].min()) else None
+        time_stats['last_incident'] = df['received_date_time'].max().strftime('%Y-%m-%d') if not pd.isna(df['received_date_time'].max()) else None
+    
+    # Calculate average resolution times if available
+    if 'action_time_hours' in df.columns:
+        time_stats['avg_action_time_hours'] = round(df['action_time_hours'].mean(), 2)
+        
+    if 'resolution_time_hours' in df.columns:
+        time_stats['avg_resolution_time_hours'] = round(df['resolution_time_hours'].mean(), 2)
+    
+    # Monthly incident counts if date column exists
+    monthly_counts = {}
+    if 'received_date_time' in df.columns:
+        # Count on monthly periods and format only the distinct months, rather than strftime per row
+        month_counts = df['received_date_time'].dt.to_period('M').value_counts().sort_index()
+        month_counts.index = month_counts.index.strftime('%Y-%m')
+        monthly_counts = month_counts.to_dict()
+    
+    return {
+        "total_incidents": len(df),
+        "incident_types": incident_types,
+        "taluk_stats": taluk_counts,
+        "source_stats": source_counts,
+        "time_stats": time_stats,
+        "monthly_counts": monthly_counts
+    }
+
 class DataPreprocessor:
     def __init__(self, excel_path=None, csv_path=None):
         """
@@ -15,6 +90,7 @@ class DataPreprocessor:
         self.excel_path = excel_path
         self.csv_path = csv_path
         self.data = None
+        self._stats_cache = None
         
     def load_data(self):
         """
@@ -25,16 +101,49 @@ class DataPreprocessor:
         """
         if self.csv_path and os.path.exists(self.csv_path):
             print(f"Loading data from {self.csv_path}")
-            self.data = pd.read_csv(self.csv_path)
+            self.data = pd.read_csv(self.csv_path, usecols=is_required_column)
         elif self.excel_path and os.path.exists(self.excel_path):
-            print(f"Loading data from {self.excel_path}")
-            self.data = pd.read_excel(self.excel_path)
+            self.data = self.load_excel()
         else:
             raise ValueError("No valid data file path provided")
+        self._stats_cache = None
             
         print(f"Loaded {len(self.data)} records")
         return self.data
     
+    def load_excel(self):
+        """
+        Load the Excel file, going through a Feather copy in backend/data/cache.
+        
+        Parsing the workbook is slow, so the first load writes the required
+        columns to Feather and later loads read that instead until the Excel
+        file or the set of required columns changes.
+        
+        Returns:
+            pd.DataFrame: Loaded DataFrame
+        """
+        cache_name = os.path.splitext(os.path.basename(self.excel_path))[0] + '.feather'
+        cache_path = os.path.join(EXCEL_CACHE_DIR, cache_name)
+        columns_key = orjson.dumps(REQUIRED_COLUMNS)
+        
+        if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(self.excel_path):
+            table = feather.read_table(cache_path)
+            if (table.schema.metadata or {}).get(b'required_columns') == columns_key:
+                print(f"Loading data from {cache_path}")
+                return table.to_pandas()
+        
+        print(f"Loading data from {self.excel_path}")
+        data = pd.read_excel(self.excel_path, engine='openpyxl', usecols=is_required_column)
+        try:
+            # Record the columns the copy was made with, so changing them invalidates it
+            table = pa.Table.from_pandas(data, preserve_index=False)
+            metadata = {**(table.schema.metadata or {}), b'required_columns': columns_key}
+            os.makedirs(EXCEL_CACHE_DIR, exist_ok=True)
+            feather.write_feather(table.replace_schema_metadata(metadata), cache_path, compression='zstd')
+        except Exception as e:
+            print(f"Could not cache {self.excel_path} as Feather: {str(e)}")
+        return data
+    
     def clean_data(self):
         """
         Clean and preprocess the data.
@@ -45,11 +154,11 @@ class DataPreprocessor:
         if self.data is None:
             self.load_data()
             
-        # Make a copy to avoid modifying the original
-        df = self.data.copy()
+        # Clean in place; the loaded frame is replaced by the cleaned one anyway
+        df = self.data
         
         # Convert column names to lowercase and replace spaces with underscores
-        df.columns = [col.lower().replace(' ', '_').replace('.', '').replace('/', '_') for col in df.columns]
+        df.columns = [normalize_column(col) for col in df.columns]
         
         # Handle missing values for text fields
         text_columns = ['incident_type', 'location', 'taluk', 'action_remarks', 'closed_remarks', 'info_source']
@@ -60,11 +169,14 @@ class DataPreprocessor:
         # Convert date columns to datetime if they exist
         date_columns = [col for col in df.columns if 'date' in col or 'time' in col or col in ['received_date_time', 'incident_reported_at', 'action_date_time', 'closed_at']]
         for col in date_columns:
-            if col in df.columns:
-                try:
-                    df[col] = pd.to_datetime(df[col], errors='coerce')
-                except:
-                    print(f"Could not convert {col} to datetime")
+            # The incident export uses a single timestamp format, which parses much
+            # faster when given explicitly than when pandas has to infer it
+            parsed = pd.to_datetime(df[col], format=DATE_FORMAT, errors='coerce')
+            
+            # Fall back to format inference for columns that don't follow it
+            if parsed.notna().sum() < df[col].notna().sum():
+                parsed = pd.to_datetime(df[col], errors='coerce')
+            df[col] = parsed
         
         # Calculate time differences if both action and incident dates exist
         if 'incident_reported_at' in df.columns and 'action_date_time' in df.columns:
@@ -83,48 +195,76 @@ class DataPreprocessor:
         ]
         text_columns = [col for col in text_columns if col in df.columns]
         
-        df['combined_text'] = df[text_columns].apply(
-            lambda row: ' '.join(str(val) for val in row if pd.notna(val)), 
-            axis=1
-        )
+        # Join the non-missing values of each row with single spaces, one column at a time
+        combined_text = pd.Series('', index=df.index)
+        for col in text_columns:
+            combined_text += (' ' + df[col].astype(str)).where(df[col].notna(), '')
+        df['combined_text'] = combined_text.str[1:]
         
-        # Add time information to combined text
-        if 'time_taken_to_take_action' in df.columns:
-            df['combined_text'] += df['time_taken_to_take_action'].apply(
-                lambda x: f" Action time: {x}" if pd.notna(x) else ""
-            )
-            
-        if 'time_taken_to_close' in df.columns:
-            df['combined_text'] += df['time_taken_to_close'].apply(
-                lambda x: f" Resolution time: {x}" if pd.notna(x) else ""
-            )
+        # Add time information to combined text, masking out missing values
+        time_suffixes = [
+            ('time_taken_to_take_action', ' Action time: '),
+            ('time_taken_to_close', ' Resolution time: ')
+        ]
+        for col, label in time_suffixes:
+            if col in df.columns:
+                df['combined_text'] += (label + df[col].astype(str)).where(df[col].notna(), '')
+        
+        # Low-cardinality labels are stored as categoricals so counting, filtering
+        # and grouping work on integer codes instead of repeated strings
+        for col in ['incident_type', 'taluk']:
+            if col in df.columns:
+                df[col] = df[col].astype('category')
         
         self.data = df
+        
+        # The cleaned data doesn't change afterwards, so compute its statistics once
+        self._stats_cache = self.compute_data_stats()
         print(f"Data cleaned. Shape: {df.shape}")
         return df
     
-    def save_processed_data(self, output_path):
+    def save_processed_data(self, output_path, output_format='feather'):
         """
-        Save the processed data to a CSV file.
+        Save the processed data to disk.
         
         Args:
-            output_path (str): Path to save the processed data
+            output_path (str): Path to save the processed data; the extension is
+                replaced to match the output format
+            output_format (str): 'feather' (default) writes a zstd-compressed Feather
+                file; 'csv' writes the legacy CSV plus JSON pair
+        
+        Returns:
+            str: Path of the file the embedding step should read
         """
         if self.data is None:
             raise ValueError("No data to save. Please load and clean data first.")
+        if output_format not in ('feather', 'csv'):
+            raise ValueError(f"Unsupported output format: {output_format}")
             
         # Create directory if it doesn't exist
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
+        base_path = os.path.splitext(output_path)[0]
+        
+        if output_format == 'feather':
+            # Columnar binary format keeps dtypes and is much faster to write and read
+            feather_path = base_path + '.feather'
+            self.data.to_feather(feather_path, compression='zstd')
+            print(f"Processed data saved to {feather_path}")
+            self.save_summary_stats(os.path.dirname(output_path))
+            return feather_path
+        
         # Save to CSV
-        self.data.to_csv(output_path, index=False)
-        print(f"Processed data saved to {output_path}")
+        csv_path = base_path + '.csv'
+        self.data.to_csv(csv_path, index=False)
+        print(f"Processed data saved to {csv_path}")
         
         # Also save a JSON version for easier consumption by the RAG system
-        json_path = output_path.replace('.csv', '.json')
+        json_path = base_path + '.json'
         
-        # Convert datetime columns to strings for JSON serialization
-        json_df = self.data.copy()
+        # Convert datetime columns to strings for JSON serialization; a shallow
+        # copy is enough since only those columns are replaced
+        json_df = self.data.copy(deep=False)
         for col in json_df.columns:
             if pd.api.types.is_datetime64_any_dtype(json_df[col]):
                 json_df[col] = json_df[col].dt.strftime('%Y-%m-%d %H:%M:%S')
@@ -132,17 +272,47 @@ class DataPreprocessor:
         # Save to JSON
         json_df.to_json(json_path, orient='records', date_format='iso')
         print(f"JSON version saved to {json_path}")
+        self.save_summary_stats(os.path.dirname(output_path))
+        return json_path
+    
+    def save_summary_stats(self, output_dir):
+        """
+        Precompute the API's /stats summary so it isn't derived from the full
+        data at request time. Written after the data file so it is never older.
+        
+        Args:
+            output_dir (str): Directory to save stats.json in
+        """
+        stats_path = os.path.join(output_dir, 'stats.json')
+        with open(stats_path, 'wb') as f:
+            f.write(orjson.dumps(
+                compute_incident_stats(self.data),
+                option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+            ))
+        print(f"Summary statistics saved to {stats_path}")
         
     def get_data_stats(self):
         """
-        Get basic statistics about the data.
+        Get basic statistics about the data, computed once per loaded or
+        cleaned dataset.
         
         Returns:
             dict: Dictionary containing data statistics
         """
         if self.data is None:
             raise ValueError("No data available. Please load data first.")
-            
+        
+        if self._stats_cache is None:
+            self._stats_cache = self.compute_data_stats()
+        return self._stats_cache
+    
+    def compute_data_stats(self):
+        """
+        Compute basic statistics about the current data.
+        
+        Returns:
+            dict: Dictionary containing data statistics
+        """
         stats = {
             "total_records": len(self.data),
             "columns": list(self.data.columns),
@@ -0,0 +1,153 @@
+import os
+import numpy as np
+from typing import List
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Default location of the INT8 ONNX export (backend/models/all-MiniLM-L6-v2-int8)
+QUANTIZED_MODEL_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "models", "all-MiniLM-L6-v2-int8"
+)
+QUANTIZED_MODEL_FILE = "model_int8.onnx"
+
+# Threads for FAISS and the embedding backend. Defaults to half the CPUs so
+# indexing and embedding running side by side don't oversubscribe the host
+NUM_THREADS = int(os.environ.get("FAISS_NUM_THREADS", max(1, (os.cpu_count() or 2) // 2)))
+
+def configure_threads(num_threads: int = NUM_THREADS):
+    """
+    Pin the FAISS (OpenMP) and PyTorch thread pools to num_threads.
+    
+    Args:
+        num_threads (int): Number of threads each library may use
+    """
+    import faiss
+    faiss.omp_set_num_threads(num_threads)
+    
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+    except ImportError:
+        pass
+
+class QuantizedEmbedder:
+    def __init__(self, model_dir: str = QUANTIZED_MODEL_DIR, max_length: int = 256):
+        """
+        Sentence embedder backed by an INT8-quantized ONNX export of all-MiniLM-L6-v2.
+        
+        Exposes the subset of SentenceTransformer.encode used by this project, so it
+        can stand in for the fp32 model in both indexing and retrieval.
+        
+        Args:
+            model_dir (str): Directory containing the quantized model and tokenizer
+            max_length (int): Maximum number of tokens per text
+        """
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        
+        self.model_dir = model_dir
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        session_options = ort.SessionOptions()
+        session_options.intra_op_num_threads = NUM_THREADS
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, QUANTIZED_MODEL_FILE),
+            sess_options=session_options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+    
+    def encode(self, texts: List[str], batch_size: int = 64, normalize_embeddings: bool = True,
+               convert_to_numpy: bool = True, show_progress_bar: bool = False) -> np.ndarray:
+        """
+        Encode texts into sentence embeddings.
+        
+        Args:
+            texts (List[str]): Texts to encode
+            batch_size (int): Number of texts per forward pass
+            normalize_embeddings (bool): Whether to L2-normalize the embeddings
+            convert_to_numpy (bool): Accepted for compatibility; output is always numpy
+            show_progress_bar (bool): Accepted for compatibility; no progress bar is shown
+        
+        Returns:
+            np.ndarray: float32 array of shape (len(texts), embedding_dim)
+        """
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np"
+            )
+            inputs = {name: encoded[name].astype(np.int64) for name in self.input_names}
+            token_embeddings = self.session.run(None, inputs)[0]
+            
+            # Mean-pool over real tokens only, as sentence-transformers does
+            mask = encoded["attention_mask"][..., np.newaxis].astype(np.float32)
+            summed = (token_embeddings * mask).sum(axis=1)
+            batches.append(summed / np.clip(mask.sum(axis=1), 1e-9, None))
+        
+        if not batches:
+            return np.zeros((0, self.session.get_outputs()[0].shape[-1]), dtype=np.float32)
+        
+        embeddings = np.concatenate(batches).astype(np.float32)
+        if normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings
+
+def load_embedding_model(model_dir: str = QUANTIZED_MODEL_DIR):
+    """
+    Load the INT8 ONNX embedder if it has been exported, otherwise the fp32 model.
+    
+    Args:
+        model_dir (str): Directory containing the quantized model
+    
+    Returns:
+        QuantizedEmbedder or SentenceTransformer: Model with an encode() method
+    """
+    if os.path.exists(os.path.join(model_dir, QUANTIZED_MODEL_FILE)):
+        try:
+            return QuantizedEmbedder(model_dir)
+        except ImportError as e:
+            print(f"Could not load quantized embedding model: {str(e)}")
+    
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL_NAME, device='cpu')
+
+def export_quantized_model(output_dir: str = QUANTIZED_MODEL_DIR):
+    """
+    Export all-MiniLM-L6-v2 to ONNX and quantize its MatMul weights to INT8.
+    
+    Args:
+        output_dir (str): Directory to save the quantized model and tokenizer
+    """
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    from transformers import AutoTokenizer
+    
+    os.makedirs(output_dir, exist_ok=True)
+    
+    print(f"Exporting {EMBEDDING_MODEL_NAME} to ONNX...")
+    model = ORTModelForFeatureExtraction.from_pretrained(EMBEDDING_MODEL_NAME, export=True)
+    model.save_pretrained(output_dir)
+    AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME).save_pretrained(output_dir)
+    
+    print("Quantizing MatMul weights to INT8...")
+    quantize_dynamic(
+        model_input=os.path.join(output_dir, "model.onnx"),
+        model_output=os.path.join(output_dir, QUANTIZED_MODEL_FILE),
+        op_types_to_quantize=["MatMul"],
+        weight_type=QuantType.QInt8
+    )
+    print(f"Saved quantized model to {output_dir}")
+
+# Example usage
+if __name__ == "__main__":
+    export_quantized_model()
+    
+    embedder = QuantizedEmbedder()
+    embeddings = embedder.encode(["Tree fallen across the road in Mangalore"])
+    print(f"Embedding shape: {embeddings.shape}")
@@ -19,8 +19,7 @@ def main():
     
     # Define paths
     excel_path = os.path.join(os.path.dirname(backend_dir), "Incident_Report (1).xlsx")
-    output_path = os.path.join(data_dir, "processed_incidents.csv")
-    json_path = output_path.replace('.csv', '.json')
+    output_path = os.path.join(data_dir, "processed_incidents.feather")
     vector_store_dir = os.path.join(data_dir, "vector_store")
     
     print(f"Excel path: {excel_path}")
@@ -32,18 +31,16 @@ def main():
         preprocessor = DataPreprocessor(excel_path)
         preprocessor.load_data()
         preprocessor.clean_data()
-        preprocessor.save_processed_data(output_path)
+        data_path = preprocessor.save_processed_data(output_path)
         
         # Get and print data statistics
         stats = preprocessor.get_data_stats()
         print("\nData preprocessing completed successfully!")
-        print(f"Processed data saved to {output_path}")
-        print(f"JSON version saved to {json_path}")
+        print(f"Processed data saved to {data_path}")
         
         # Step 2: Text Chunking and Embedding
         print("\n===== Step 2: Text Chunking and Embedding =====")
-        processor = TextProcessor(json_path)
-        processor.load_data()
+        processor = TextProcessor(data_path)
         processor.create_chunks()
         processor.initialize_embedding_model()
         processor.generate_embeddings()
@@ -0,0 +1,80 @@
+import os
+import httpx
+import orjson
+from typing import Iterator
+
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+
+class OllamaClient:
+    def __init__(self, base_url: str = OLLAMA_BASE_URL, timeout: float = 300.0):
+        """
+        Minimal client for Ollama's generate API.
+        
+        Holds one httpx.Client so every request reuses the same pool of
+        keep-alive connections instead of opening a new one per answer.
+        
+        Args:
+            base_url (str): URL of the Ollama server
+            timeout (float): Seconds to wait for a response before giving up
+        """
+        self.base_url = base_url
+        self.client = httpx.Client(
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout, connect=10.0),
+            limits=httpx.Limits(max_keepalive_connections=20)
+        )
+    
+    def generate(self, model: str, prompt: str) -> str:
+        """
+        Generate a complete response for a prompt.
+        
+        Args:
+            model (str): Name of the Ollama model to use
+            prompt (str): Prompt text
+        
+        Returns:
+            str: Generated text
+        """
+        response = self.client.post("/api/generate", json={"model": model, "prompt": prompt, "stream": False})
+        response.raise_for_status()
+        return orjson.loads(response.content)["response"]
+    
+    def generate_stream(self, model: str, prompt: str) -> Iterator[str]:
+        """
+        Generate a response for a prompt, yielding tokens as Ollama produces them.
+        
+        Args:
+            model (str): Name of the Ollama model to use
+            prompt (str): Prompt text
+        
+        Returns:
+            Iterator[str]: Generated tokens
+        """
+        payload = {"model": model, "prompt": prompt, "stream": True}
+        with self.client.stream("POST", "/api/generate", json=payload) as response:
+            response.raise_for_status()
+            
+            # Ollama streams one JSON object per line, the last one marked done
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                
+                message = orjson.loads(line)
+                if message.get("response"):
+                    yield message["response"]
+                if message.get("done"):
+                    break
+    
+    def close(self):
+        """Close the pooled connections"""
+        self.client.close()
+
+# Example usage
+if __name__ == "__main__":
+    client = OllamaClient()
+    
+    for token in client.generate_stream("mistral", "Name three common causes of urban flooding."):
+        print(token, end="", flush=True)
+    print()
+    
+    client.close()
@@ -1,12 +1,182 @@
 import os
-import json
+import mmap
+import orjson
+import threading
 import faiss
 import numpy as np
-from typing import List, Dict, Any, Optional
-from langchain_community.llms import Ollama
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, NamedTuple, Tuple, Union, Iterator
+from embedding_model import load_embedding_model, configure_threads
+from ollama_client import OllamaClient
+
+# Keep FAISS and the embedding backend from oversubscribing the CPUs
+configure_threads()
+
+# Search depth for HNSW indexes; higher improves recall at some latency cost
+HNSW_EF_SEARCH = 64
+
+# Cosine similarity above which a past query's answer is reused
+SEMANTIC_CACHE_THRESHOLD = 0.97
+SEMANTIC_CACHE_MAX_ENTRIES = 1000
+
+def read_index_mmap(index_path: str):
+    """
+    Read a FAISS index memory-mapped and read-only, so the OS pages in only the
+    parts queries touch. Falls back to a regular read for index types that
+    can't be mapped.
+    """
+    try:
+        return faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError as e:
+        print(f"Could not memory-map FAISS index, reading it fully: {str(e)}")
+        return faiss.read_index(index_path)
+
+# Prompt for answer generation; only {context} and {query} vary per call
+PROMPT_TEMPLATE = """
+        You are an AI assistant for the Mangalore Smart City Incident Management System.
+        
+        Use the following incident data to answer the user's question. The data includes information about various incidents in Mangalore, including landslides, floods, tree falls, and other emergencies.
+        
+        INCIDENT DATA:
+        {context}
+        
+        USER QUESTION: {query}
+        
+        Provide a clear, concise, and accurate answer based only on the information provided above. Include relevant statistics or data points if available.
+        
+        If the question asks about time-related information (like resolution times, response times, etc.), be sure to include that in your answer.
+        
+        If the question asks about specific locations or taluks, provide that geographic information in your answer.
+        
+        If the question asks for a comparison between different incident types, locations, or time periods, structure your answer to clearly show the comparison.
+        
+        If you don't know the answer or the information is not in the provided data, say "I don't have enough information to answer this question."
+        
+        ANSWER:
+        """
+
+class ChunkStore:
+    def __init__(self, chunks_path: str, offsets_path: str):
+        """
+        Read-only view of a chunks.jsonl file that parses chunks on access.
+        
+        The file is memory-mapped and chunk i is the line between byte offsets
+        i and i + 1 of the offsets file, so only the chunks a search returns
+        are ever decoded.
+        
+        Args:
+            chunks_path (str): Path to the JSONL file, one chunk per line
+            offsets_path (str): Path to the uint64 line start offsets (plus end of file)
+        """
+        self.offsets = np.load(offsets_path, mmap_mode='r')
+        with open(chunks_path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if len(self) else b""
+    
+    def __len__(self) -> int:
+        return max(len(self.offsets) - 1, 0)
+    
+    def __getitem__(self, idx: int) -> Dict:
+        return orjson.loads(self.data[int(self.offsets[idx]):int(self.offsets[idx + 1])])
+
+def load_chunks(vector_store_dir: str):
+    """
+    Open the chunks of a vector store, preferring the indexed JSONL layout and
+    falling back to parsing a chunks.json array from older builds.
+    
+    Args:
+        vector_store_dir (str): Directory containing the vector store
+        
+    Returns:
+        ChunkStore or List[Dict]: Chunks addressable by FAISS id
+    """
+    chunks_path = os.path.join(vector_store_dir, "chunks.jsonl")
+    offsets_path = os.path.join(vector_store_dir, "chunks.idx")
+    if os.path.exists(chunks_path) and os.path.exists(offsets_path):
+        return ChunkStore(chunks_path, offsets_path)
+    
+    with open(os.path.join(vector_store_dir, "chunks.json"), 'rb') as f:
+        return orjson.loads(f.read())
+
+class VectorStore(NamedTuple):
+    chunks: Union[ChunkStore, List[Dict]]
+    index: Any
+
+@lru_cache(maxsize=4)
+def load_vector_store(vector_store_dir: str) -> VectorStore:
+    """
+    Load the chunks and FAISS index from a vector store directory. Cached per
+    directory so retrievers created later reuse them; call
+    load_vector_store.cache_clear() after rebuilding the store.
+    
+    Args:
+        vector_store_dir (str): Directory containing the vector store
+        
+    Returns:
+        VectorStore: Loaded chunks and index
+    """
+    # Load chunks in the background while the FAISS index is read
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        chunks_future = executor.submit(load_chunks, vector_store_dir)
+        
+        # Load FAISS index
+        index_path = os.path.join(vector_store_dir, "faiss_index.bin")
+        index = read_index_mmap(index_path)
+        
+        chunks = chunks_future.result()
+    print(f"Loaded {len(chunks)} chunks")
+    
+    # Stores built before the switch to inner product use IndexFlatL2. Their vectors
+    # are unit-normalized, so an inner-product index ranks them identically while
+    # skipping the norm terms of the L2 distance
+    if isinstance(index, faiss.IndexFlatL2):
+        ip_index = faiss.IndexFlatIP(index.d)
+        ip_index.add(index.reconstruct_n(0, index.ntotal))
+        index = ip_index
+    
+    if hasattr(index, 'hnsw'):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    print(f"Loaded FAISS index with {index.ntotal} vectors")
+    
+    return VectorStore(chunks, index)
+
+def find_processed_data(data_dir: str) -> str:
+    """Return the processed incidents file in data_dir, preferring Feather over JSON"""
+    feather_path = os.path.join(data_dir, "processed_incidents.feather")
+    if os.path.exists(feather_path):
+        return feather_path
+    return os.path.join(data_dir, "processed_incidents.json")
+
+@lru_cache(maxsize=1)
+def load_records(data_path: str) -> List[Dict]:
+    """
+    Load the processed incident records, in the order chunk sources refer to them.
+    Cached so the file is read once, on the first record lookup.
+    
+    Args:
+        data_path (str): Path to the processed data (Feather or JSON format)
+        
+    Returns:
+        List[Dict]: Incident records
+    """
+    from text_embedding import TextProcessor
+    return TextProcessor(data_path).data
+
+@lru_cache(maxsize=1)
+def get_embedding_model():
+    """Load the query embedding model once per process"""
+    print("Loading embedding model...")
+    embedding_model = load_embedding_model()
+    print("Embedding model loaded")
+    return embedding_model
+
+@lru_cache(maxsize=1)
+def get_ollama_client() -> OllamaClient:
+    """Create the Ollama client once per process, so its connections are reused"""
+    print("Initializing Ollama client...")
+    client = OllamaClient()
+    print("Ollama client initialized")
+    return client
 
 class IncidentRetriever:
     def __init__(self, vector_store_dir: str, model_name: str = "mistral"):
@@ -19,140 +189,228 @@ class IncidentRetriever:
         """
         self.vector_store_dir = vector_store_dir
         self.model_name = model_name
+        self.data_path = find_processed_data(os.path.dirname(os.path.abspath(vector_store_dir)))
         self.chunks = None
         self.index = None
         self.embedding_model = None
         self.llm = None
         
+        # Semantic response cache: per (model, k), an inner-product index over past
+        # query embeddings alongside their (chunks, answer) responses
+        self._response_cache: Dict[Tuple[str, int], Tuple[Any, List[Tuple[List[Dict], str]]]] = {}
+        self._response_cache_lock = threading.Lock()
+        
     def load_resources(self):
         """
         Load all necessary resources: chunks, index, embedding model, and LLM.
         """
         print("Loading resources...")
         
-        # Load chunks
-        chunks_path = os.path.join(self.vector_store_dir, "chunks.json")
-        with open(chunks_path, 'r') as f:
-            self.chunks = json.load(f)
-        print(f"Loaded {len(self.chunks)} chunks")
-        
-        # Load FAISS index
-        index_path = os.path.join(self.vector_store_dir, "faiss_index.bin")
-        self.index = faiss.read_index(index_path)
-        print(f"Loaded FAISS index with {self.index.ntotal} vectors")
-        
-        # Load embedding model
-        print("Loading embedding model...")
-        self.embedding_model = HuggingFaceEmbeddings(
-            model_name="all-MiniLM-L6-v2",
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
-        )
-        print("Embedding model loaded")
+        # Heavy resources are cached at module level and shared between retrievers.
+        # The vector store and embedding model are independent, so load them together
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            vector_store_future = executor.submit(load_vector_store, self.vector_store_dir)
+            embedding_model_future = executor.submit(get_embedding_model)
+            self.chunks, self.index = vector_store_future.result()
+            self.embedding_model = embedding_model_future.result()
         
         # Initialize Ollama LLM
-        print(f"Initializing Ollama with model {self.model_name}...")
-        self.llm = Ollama(model=self.model_name)
-        print("Ollama initialized")
+        self.ensure_llm()
+    
+    def ensure_llm(self):
+        """
+        Make self.llm the shared Ollama client. The client serves every model,
+        so switching models doesn't create a new one.
         
-    def retrieve_relevant_chunks(self, query: str, k: int = 5) -> List[Dict]:
+        Returns:
+            OllamaClient: Client used to generate answers
         """
-        Retrieve the k most relevant chunks for a query.
+        self.llm = get_ollama_client()
+        return self.llm
+        
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Embed queries for searching the index, in a single model call.
         
         Args:
-            query (str): The query string
-            k (int): Number of chunks to retrieve
+            queries (List[str]): The query strings
             
         Returns:
-            List[Dict]: List of relevant chunks with metadata
+            np.ndarray: float32 array of shape (len(queries), embedding_dim)
         """
-        if self.index is None or self.chunks is None or self.embedding_model is None:
+        if self.embedding_model is None:
             self.load_resources()
             
-        # Generate embedding for the query
-        query_embedding = self.embedding_model.embed_query(query)
+        return self.embedding_model.encode(
+            queries, normalize_embeddings=True, convert_to_numpy=True, show_progress_bar=False
+        ).astype('float32', copy=False)
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """
+        Embed a query for searching the index.
         
-        # Search the index
+        Args:
+            query (str): The query string
+            
+        Returns:
+            np.ndarray: float32 array of shape (1, embedding_dim)
+        """
+        return self.embed_queries([query])
+    
+    def search_chunks(self, query_embeddings: np.ndarray, ks: List[int]) -> List[List[Dict]]:
+        """
+        Find the most relevant chunks for several queries with one index search.
+        
+        Args:
+            query_embeddings (np.ndarray): Query embeddings, one row per query
+            ks (List[int]): Number of chunks to retrieve for each query
+            
+        Returns:
+            List[List[Dict]]: Relevant chunks for each query
+        """
+        if self.index is None or self.chunks is None:
+            self.load_resources()
+            
+        # Search the index once for the largest k, then trim per query
         distances, indices = self.index.search(
-            np.array([query_embedding]).astype('float32'), 
-            k=min(k, len(self.chunks))
+            query_embeddings, 
+            k=min(max(ks), len(self.chunks))
         )
         
         # Get the relevant chunks
-        relevant_chunks = [self.chunks[idx] for idx in indices[0]]
+        # Approximate indexes pad with -1 when fewer than k neighbours are found
+        return [
+            [self.chunks[idx] for idx in row[:k] if idx >= 0]
+            for row, k in zip(indices, ks)
+        ]
+    
+    def retrieve_batch(self, queries: List[str], ks: List[int]) -> Tuple[np.ndarray, List[List[Dict]]]:
+        """
+        Embed and search several queries together.
         
-        return relevant_chunks
+        Args:
+            queries (List[str]): The query strings
+            ks (List[int]): Number of chunks to retrieve for each query
+            
+        Returns:
+            Tuple[np.ndarray, List[List[Dict]]]: Query embeddings and relevant chunks for each query
+        """
+        query_embeddings = self.embed_queries(queries)
+        return query_embeddings, self.search_chunks(query_embeddings, ks)
     
-    def generate_answer(self, query: str, relevant_chunks: List[Dict]) -> str:
+    def retrieve_relevant_chunks(self, query: str, k: int = 5,
+                                 query_embedding: Optional[np.ndarray] = None) -> List[Dict]:
         """
-        Generate an answer to the query using the relevant chunks and Ollama.
+        Retrieve the k most relevant chunks for a query.
         
         Args:
             query (str): The query string
-            relevant_chunks (List[Dict]): List of relevant chunks
+            k (int): Number of chunks to retrieve
+            query_embedding (np.ndarray, optional): Precomputed embedding of the query
             
         Returns:
-            str: Generated answer
+            List[Dict]: List of relevant chunks with metadata
         """
-        if self.llm is None:
-            self.load_resources()
-            
-        # Prepare context from chunks
-        context = "\n\n".join([chunk["text"] for chunk in relevant_chunks])
-        
-        # Create prompt template
-        template = """
-        You are an AI assistant for the Mangalore Smart City Incident Management System.
-        
-        Use the following incident data to answer the user's question. The data includes information about various incidents in Mangalore, including landslides, floods, tree falls, and other emergencies.
-        
-        INCIDENT DATA:
-        {context}
-        
-        USER QUESTION: {query}
-        
-        Provide a clear, concise, and accurate answer based only on the information provided above. Include relevant statistics or data points if available.
-        
-        If the question asks about time-related information (like resolution times, response times, etc.), be sure to include that in your answer.
-        
-        If the question asks about specific locations or taluks, provide that geographic information in your answer.
-        
-        If the question asks for a comparison between different incident types, locations, or time periods, structure your answer to clearly show the comparison.
-        
-        If you don't know the answer or the information is not in the provided data, say "I don't have enough information to answer this question."
+        # Generate embedding for the query
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
         
-        ANSWER:
+        return self.search_chunks(query_embedding, [k])[0]
+    
+    def get_record(self, chunk: Dict) -> Dict:
         """
+        Look up the full incident record a chunk was created from.
         
-        prompt = PromptTemplate(
-            input_variables=["context", "query"],
-            template=template
-        )
+        Args:
+            chunk (Dict): Chunk returned by a search
+            
+        Returns:
+            Dict: Incident record
+        """
+        # Stores built before records were dropped from chunk metadata still carry them
+        if "record" in chunk["metadata"]:
+            return chunk["metadata"]["record"]
+        return load_records(self.data_path)[chunk["metadata"]["source"]]
+    
+    def build_prompt(self, query: str, relevant_chunks: List[Dict]) -> str:
+        """
+        Build the answer-generation prompt for a query.
         
-        # Create chain
-        chain = LLMChain(llm=self.llm, prompt=prompt)
+        Args:
+            query (str): The query string
+            relevant_chunks (List[Dict]): List of relevant chunks
+            
+        Returns:
+            str: Prompt text
+        """
+        # Prepare context from chunks
+        context = "\n\n".join([chunk["text"] for chunk in relevant_chunks])
+        return PROMPT_TEMPLATE.format(context=context, query=query)
+    
+    def generate_answer(self, query: str, relevant_chunks: List[Dict], model: Optional[str] = None) -> str:
+        """
+        Generate an answer to the query using the relevant chunks and Ollama.
         
-        # Run chain
-        response = chain.run(context=context, query=query)
+        Args:
+            query (str): The query string
+            relevant_chunks (List[Dict]): List of relevant chunks
+            model (str, optional): Ollama model to use; defaults to self.model_name
+            
+        Returns:
+            str: Generated answer
+        """
+        self.ensure_llm()
+        return self.llm.generate(model or self.model_name, self.build_prompt(query, relevant_chunks))
+    
+    def generate_answer_stream(self, query: str, relevant_chunks: List[Dict],
+                               model: Optional[str] = None) -> Iterator[str]:
+        """
+        Generate an answer to the query, yielding tokens as Ollama produces them.
         
-        return response
+        Args:
+            query (str): The query string
+            relevant_chunks (List[Dict]): List of relevant chunks
+            model (str, optional): Ollama model to use; defaults to self.model_name
+            
+        Returns:
+            Iterator[str]: Answer tokens
+        """
+        self.ensure_llm()
+        return self.llm.generate_stream(model or self.model_name, self.build_prompt(query, relevant_chunks))
     
-    def process_query(self, query: str, k: int = 5) -> Dict[str, Any]:
+    def process_query(self, query: str, k: int = 5, query_embedding: Optional[np.ndarray] = None,
+                      relevant_chunks: Optional[List[Dict]] = None,
+                      model: Optional[str] = None) -> Dict[str, Any]:
         """
         Process a query and return the answer along with relevant chunks.
         
         Args:
             query (str): The query string
             k (int): Number of chunks to retrieve
+            query_embedding (np.ndarray, optional): Precomputed embedding of the query
+            relevant_chunks (List[Dict], optional): Chunks already retrieved for the query
+            model (str, optional): Ollama model to answer with; defaults to self.model_name.
+                Passed per call so concurrent queries can use different models
             
         Returns:
             Dict[str, Any]: Dictionary containing the answer and relevant chunks
         """
-        # Retrieve relevant chunks
-        relevant_chunks = self.retrieve_relevant_chunks(query, k)
+        model = model or self.model_name
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
         
-        # Generate answer
-        answer = self.generate_answer(query, relevant_chunks)
+        # Near-identical queries reuse an earlier answer instead of calling the LLM
+        cached = self.lookup_cached_response(query_embedding, k, model)
+        if cached is not None:
+            relevant_chunks, answer = cached
+        else:
+            # Retrieve relevant chunks
+            if relevant_chunks is None:
+                relevant_chunks = self.retrieve_relevant_chunks(query, k, query_embedding)
+            
+            # Generate answer
+            answer = self.generate_answer(query, relevant_chunks, model)
+            self.cache_response(query_embedding, k, model, relevant_chunks, answer)
         
         # Prepare response
         response = {
@@ -163,6 +421,103 @@ class IncidentRetriever:
         }
         
         return response
+    
+    def process_query_stream(self, query: str, k: int = 5, query_embedding: Optional[np.ndarray] = None,
+                             relevant_chunks: Optional[List[Dict]] = None,
+                             model: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Process a query, streaming the answer as it is generated.
+        
+        The first event carries the relevant chunks, each following event one
+        answer token, and the last event has "done" set.
+        
+        Args:
+            query (str): The query string
+            k (int): Number of chunks to retrieve
+            query_embedding (np.ndarray, optional): Precomputed embedding of the query
+            relevant_chunks (List[Dict], optional): Chunks already retrieved for the query
+            model (str, optional): Ollama model to answer with; defaults to self.model_name.
+                Passed per call so concurrent queries can use different models
+            
+        Returns:
+            Iterator[Dict[str, Any]]: Response events
+        """
+        model = model or self.model_name
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
+        
+        # A cached answer is sent as a single token
+        cached = self.lookup_cached_response(query_embedding, k, model)
+        if cached is not None:
+            relevant_chunks, answer = cached
+        elif relevant_chunks is None:
+            relevant_chunks = self.retrieve_relevant_chunks(query, k, query_embedding)
+        
+        yield {
+            "query": query,
+            "relevant_chunks": relevant_chunks,
+            "num_chunks_retrieved": len(relevant_chunks)
+        }
+        
+        if cached is not None:
+            yield {"token": answer}
+        else:
+            tokens = []
+            for token in self.generate_answer_stream(query, relevant_chunks, model):
+                tokens.append(token)
+                yield {"token": token}
+            self.cache_response(query_embedding, k, model, relevant_chunks, "".join(tokens))
+        
+        yield {"done": True}
+    
+    def lookup_cached_response(self, query_embedding: np.ndarray, k: int,
+                               model: str) -> Optional[Tuple[List[Dict], str]]:
+        """
+        Find a previous response to a semantically near-identical query.
+        
+        Args:
+            query_embedding (np.ndarray): Normalized query embedding
+            k (int): Number of chunks requested
+            model (str): Ollama model the answer must come from
+            
+        Returns:
+            Optional[Tuple[List[Dict], str]]: Cached chunks and answer, or None on a miss
+        """
+        with self._response_cache_lock:
+            entry = self._response_cache.get((model, k))
+            if entry is None or entry[0].ntotal == 0:
+                return None
+            
+            index, responses = entry
+            similarities, ids = index.search(query_embedding, 1)
+            if similarities[0][0] < SEMANTIC_CACHE_THRESHOLD:
+                return None
+            return responses[ids[0][0]]
+    
+    def cache_response(self, query_embedding: np.ndarray, k: int, model: str,
+                       relevant_chunks: List[Dict], answer: str):
+        """
+        Remember a response so near-identical queries can reuse it.
+        
+        Args:
+            query_embedding (np.ndarray): Normalized query embedding
+            k (int): Number of chunks requested
+            model (str): Ollama model that generated the answer
+            relevant_chunks (List[Dict]): Retrieved chunks
+            answer (str): Generated answer
+        """
+        key = (model, k)
+        with self._response_cache_lock:
+            entry = self._response_cache.get(key)
+            
+            # Start over once full rather than letting the cache grow without bound
+            if entry is None or entry[0].ntotal >= SEMANTIC_CACHE_MAX_ENTRIES:
+                entry = (faiss.IndexFlatIP(query_embedding.shape[1]), [])
+                self._response_cache[key] = entry
+            
+            index, responses = entry
+            index.add(query_embedding)
+            responses.append((relevant_chunks, answer))
 
 # Example usage
 if __name__ == "__main__":
@@ -4,7 +4,7 @@ import argparse
 import subprocess
 from data_preprocessing import DataPreprocessor
 from text_embedding import TextProcessor
-from retriever import IncidentRetriever
+from retriever import IncidentRetriever, find_processed_data
 
 def parse_args():
     """Parse command line arguments"""
@@ -14,10 +14,16 @@ def parse_args():
     parser.add_argument("--test-query", action="store_true", help="Test a sample query")
     parser.add_argument("--start-api", action="store_true", help="Start the API server")
     parser.add_argument("--all", action="store_true", help="Run all steps")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Number of API worker processes (default: one per core)")
+    parser.add_argument("--dev", action="store_true",
+                        help="Start the API server with auto-reload instead of multiple workers")
+    parser.add_argument("--format", choices=["feather", "csv"], default="feather",
+                        help="Format to write processed data in (csv also writes the legacy JSON)")
     
     return parser.parse_args()
 
-def run_preprocessing():
+def run_preprocessing(output_format="feather"):
     """Run the data preprocessing step"""
     print("\n===== Step 1: Data Preprocessing =====")
     
@@ -35,13 +41,12 @@ def run_preprocessing():
     preprocessor = DataPreprocessor(csv_path=csv_path)
     preprocessor.load_data()
     preprocessor.clean_data()
-    preprocessor.save_processed_data(output_path)
+    data_path = preprocessor.save_processed_data(output_path, output_format=output_format)
     
     # Print stats
     stats = preprocessor.get_data_stats()
     print("\nData preprocessing completed successfully!")
-    print(f"Processed data saved to {output_path}")
-    print(f"JSON version saved to {output_path.replace('.csv', '.json')}")
+    print(f"Processed data saved to {data_path}")
     print("\nDataset Statistics:")
     print(f"Total incidents: {stats['total_records']}")
     print(f"Incident types: {', '.join(list(stats['incident_types'].keys())[:5])}...")
@@ -50,9 +55,9 @@ def run_preprocessing():
     if 'date_range' in stats:
         print(f"Date range: {stats['date_range'][0]} to {stats['date_range'][1]}")
     
-    return output_path.replace('.csv', '.json')
+    return data_path
 
-def run_embedding(json_path):
+def run_embedding(data_path):
     """Run the text embedding step"""
     print("\n===== Step 2: Text Chunking and Embedding =====")
     
@@ -62,8 +67,7 @@ def run_embedding(json_path):
     vector_store_dir = os.path.join(data_dir, "vector_store")
     
     # Create processor and run
-    processor = TextProcessor(json_path)
-    processor.load_data()
+    processor = TextProcessor(data_path)
     processor.create_chunks()
     processor.initialize_embedding_model()
     processor.generate_embeddings()
@@ -101,15 +105,32 @@ def test_query(vector_store_dir):
     
     return True
 
-def start_api():
+def start_api(dev=False, workers=None):
     """Start the API server"""
     print("\n===== Step 4: Starting API Server =====")
     print("Starting FastAPI server on http://localhost:8000")
     print("Press Ctrl+C to stop the server")
     
-    # Start the API server using uvicorn
-    subprocess.run(["uvicorn", "api:app", "--host", "0.0.0.0", "--port", "8000", "--reload"], 
-                  cwd=os.path.dirname(os.path.abspath(__file__)))
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    
+    # Development: single process that restarts when the code changes
+    if dev:
+        subprocess.run(["uvicorn", "api:app", "--host", "0.0.0.0", "--port", "8000", "--reload"], 
+                      cwd=src_dir)
+        return
+    
+    import uvicorn
+    
+    # Split the cores between the workers so their FAISS, torch and ONNX Runtime
+    # thread pools don't oversubscribe the host. Workers read this when they import
+    # the retriever; an explicit FAISS_NUM_THREADS is left alone
+    workers = workers or os.cpu_count() or 1
+    os.environ.setdefault("FAISS_NUM_THREADS", str(max(1, (os.cpu_count() or 1) // workers)))
+    
+    # uvloop isn't available on Windows; httptools works everywhere
+    loop = "asyncio" if sys.platform == "win32" else "uvloop"
+    uvicorn.run("api:app", host="0.0.0.0", port=8000, app_dir=src_dir, workers=workers,
+                loop=loop, http="httptools", reload=False)
 
 def main():
     """Main function to run the pipeline"""
@@ -128,22 +149,22 @@ def main():
         return 1
     
     try:
-        json_path = None
+        data_path = None
         vector_store_dir = None
         
         # Run data preprocessing if specified
         if args.preprocess:
-            json_path = run_preprocessing()
+            data_path = run_preprocessing(args.format)
         
-        # Get JSON path if not from preprocessing
-        if json_path is None and (args.embed or args.test_query or args.start_api):
+        # Get processed data path if not from preprocessing
+        if data_path is None and (args.embed or args.test_query or args.start_api):
             current_dir = os.path.dirname(os.path.abspath(__file__))
             data_dir = os.path.join(os.path.dirname(current_dir), "data")
-            json_path = os.path.join(data_dir, "processed_incidents.json")
+            data_path = find_processed_data(data_dir)
         
         # Run text embedding if specified
         if args.embed:
-            vector_store_dir = run_embedding(json_path)
+            vector_store_dir = run_embedding(data_path)
         
         # Get vector store dir if not from embedding
         if vector_store_dir is None and (args.test_query or args.start_api):
@@ -157,7 +178,7 @@ def main():
         
         # Start API if specified
         if args.start_api:
-            start_api()
+            start_api(dev=args.dev, workers=args.workers)
         
         return 0
     except Exception as e:
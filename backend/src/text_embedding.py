@@ -1,43 +1,193 @@
 import os
-import json
+import ijson
+import orjson
 import pandas as pd
+import pyarrow as pa
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple, Iterator
+from functools import partial
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from embedding_model import load_embedding_model, configure_threads
 import faiss
 
+# Keep FAISS and the embedding backend from oversubscribing the CPUs
+configure_threads()
+
+# HNSW graph parameters: neighbours per node and build-time search depth
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+
+# Optional record fields as (label, key, include), in the order they appear in
+# the chunk text; include decides whether a present value is written
+def _always(value):
+    return True
+
+def _is_set(value):
+    return bool(value)
+
+def _not_none(value):
+    return value is not None
+
+RECORD_FIELDS = [
+    # Date information
+    ("Received Date/Time", "received_date_time", _always),
+    ("Incident Reported At", "incident_reported_at", _always),
+    # Action information
+    ("Action Taken By", "action_taken_by", _is_set),
+    ("Action Date/Time", "action_date_time", _is_set),
+    ("Action Remarks", "action_remarks", _is_set),
+    ("Time Taken to Take Action", "time_taken_to_take_action", _is_set),
+    # Closing information
+    ("Closed By", "closed_by_officer", _is_set),
+    ("Closed At", "closed_at", _is_set),
+    ("Closed Remarks", "closed_remarks", _is_set),
+    ("Time Taken to Close", "time_taken_to_close", _is_set),
+    # Source information
+    ("Information Source", "info_source", _is_set),
+    ("Information Phone", "info_phone", _is_set),
+    # Calculated fields
+    ("Action Time (hours)", "action_time_hours", _not_none),
+    ("Resolution Time (hours)", "resolution_time_hours", _not_none),
+]
+
+def format_record(record: Dict[str, Any], i: int) -> str:
+    """
+    Build the text representation of an incident record, one "Label: value" line per field.
+    
+    Args:
+        record (Dict[str, Any]): Incident record
+        i (int): Position of the record, used when it has no ID
+        
+    Returns:
+        str: Record text
+    """
+    parts = [
+        f"Incident ID: {record.get('sl_no', i)}",
+        f"Type: {record.get('incident_type', 'Unknown')}",
+        f"Location: {record.get('location', 'Unknown location')}",
+        f"Taluk: {record.get('taluk', 'Unknown')}",
+    ]
+    parts.extend(
+        f"{label}: {record[key]}"
+        for label, key, include in RECORD_FIELDS
+        if key in record and include(record[key])
+    )
+    return "\n".join(parts)
+
+# Below this many records, process start-up costs more than chunking in parallel saves
+PARALLEL_CHUNKING_MIN_RECORDS = 10000
+
+_text_splitters = {}
+
+def get_text_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    """Return a text splitter for the given settings, reused within each process"""
+    key = (chunk_size, chunk_overlap)
+    if key not in _text_splitters:
+        _text_splitters[key] = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=len,
+        )
+    return _text_splitters[key]
+
+def build_chunks(indexed_record: Tuple[int, Dict[str, Any]], chunk_size: int = 1000,
+                 chunk_overlap: int = 200) -> List[Dict[str, Any]]:
+    """
+    Create the text chunks for one incident record.
+    
+    Args:
+        indexed_record (Tuple[int, Dict[str, Any]]): Position of the record and the record
+        chunk_size (int): Size of text chunks for embedding
+        chunk_overlap (int): Overlap between chunks
+        
+    Returns:
+        List[Dict[str, Any]]: Chunks with metadata
+    """
+    i, record = indexed_record
+    text = format_record(record, i)
+    # Only the record's position is kept; the retriever resolves the full record
+    # from the processed data when it is needed
+    metadata = {"source": i}
+    
+    # Most records fit in a single chunk, so only run the splitter when needed
+    if len(text) <= chunk_size:
+        return [{"text": text, "metadata": metadata}]
+    
+    doc_chunks = get_text_splitter(chunk_size, chunk_overlap).create_documents([text], [metadata])
+    return [{"text": chunk.page_content, "metadata": chunk.metadata} for chunk in doc_chunks]
+
 class TextProcessor:
-    def __init__(self, data_path: str, chunk_size: int = 1000, chunk_overlap: int = 200):
+    def __init__(self, data_path: str, chunk_size: int = 1000, chunk_overlap: int = 200,
+                 batch_size: int = 64):
         """
         Initialize the TextProcessor with the path to the processed data.
         
         Args:
-            data_path (str): Path to the processed data (JSON format)
+            data_path (str): Path to the processed data (Feather or JSON format)
             chunk_size (int): Size of text chunks for embedding
             chunk_overlap (int): Overlap between chunks
+            batch_size (int): Number of chunks encoded per forward pass
         """
         self.data_path = data_path
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        self.data = None
+        self.batch_size = batch_size
+        self._data = None
+        self.num_records = 0
         self.chunks = []
         self.embeddings = None
         self.embedding_model = None
         self.vector_store = None
+    
+    @property
+    def data(self) -> List[Dict[str, Any]]:
+        """Incident records, read into memory in full on first access"""
+        if self._data is None:
+            self._data = list(self.load_data())
+            print(f"Loaded {len(self._data)} records")
+        return self._data
+    
+    @data.setter
+    def data(self, records: List[Dict[str, Any]]):
+        self._data = records
         
-    def load_data(self):
+    def load_data(self) -> Iterator[Dict[str, Any]]:
         """
-        Load the processed data from JSON.
+        Lazily read the processed data from Feather or JSON.
+        
+        Records are yielded one at a time so chunking can start before the whole
+        dataset is in memory.
         
         Returns:
-            List[Dict]: List of incident records
+            Iterator[Dict]: Iterator over incident records
         """
         print(f"Loading data from {self.data_path}")
-        with open(self.data_path, 'r') as f:
-            self.data = json.load(f)
-        print(f"Loaded {len(self.data)} records")
-        return self.data
+        if self.data_path.endswith('.feather'):
+            return self._iter_feather_records()
+        return self._iter_json_records()
+    
+    def _iter_feather_records(self) -> Iterator[Dict[str, Any]]:
+        """Yield records from the Feather file one record batch at a time"""
+        with pa.memory_map(self.data_path, 'r') as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i).to_pandas()
+                
+                # Match the JSON export: datetimes as strings, floats rounded to the
+                # 10 decimal places to_json writes, missing values as None
+                for col in batch.columns:
+                    if pd.api.types.is_datetime64_any_dtype(batch[col]):
+                        batch[col] = batch[col].dt.strftime('%Y-%m-%d %H:%M:%S')
+                    elif pd.api.types.is_float_dtype(batch[col]):
+                        batch[col] = batch[col].round(10)
+                yield from batch.astype(object).where(batch.notna(), None).to_dict(orient='records')
+    
+    def _iter_json_records(self) -> Iterator[Dict[str, Any]]:
+        """Yield records from the JSON array without parsing the whole file"""
+        with open(self.data_path, 'rb') as f:
+            yield from ijson.items(f, 'item', use_float=True)
     
     def create_chunks(self):
         """
@@ -46,73 +196,28 @@ class TextProcessor:
         Returns:
             List[Dict]: List of chunks with metadata
         """
-        if self.data is None:
-            self.load_data()
-            
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap,
-            length_function=len,
-        )
+        # Stream records from disk unless they have already been loaded
+        records = enumerate(self._data if self._data is not None else self.load_data())
+        build = partial(build_chunks, chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap)
         
+        # Records are independent, so large datasets are chunked across processes.
+        # Work is handed to the pool one batch at a time to bound memory use
         self.chunks = []
+        self.num_records = 0
+        batch = list(islice(records, PARALLEL_CHUNKING_MIN_RECORDS))
+        if len(batch) < PARALLEL_CHUNKING_MIN_RECORDS:
+            results = map(build, batch)
+            self.chunks = [chunk for record_chunks in results for chunk in record_chunks]
+            self.num_records = len(batch)
+        else:
+            with ProcessPoolExecutor() as executor:
+                while batch:
+                    results = executor.map(build, batch, chunksize=512)
+                    self.chunks.extend(chunk for record_chunks in results for chunk in record_chunks)
+                    self.num_records += len(batch)
+                    batch = list(islice(records, PARALLEL_CHUNKING_MIN_RECORDS))
         
-        for i, record in enumerate(self.data):
-            # Create a comprehensive text representation of the record
-            text = f"Incident ID: {record.get('sl_no', i)}\n"
-            text += f"Type: {record.get('incident_type', 'Unknown')}\n"
-            text += f"Location: {record.get('location', 'Unknown location')}\n"
-            text += f"Taluk: {record.get('taluk', 'Unknown')}\n"
-            
-            # Add date information
-            if 'received_date_time' in record:
-                text += f"Received Date/Time: {record['received_date_time']}\n"
-            if 'incident_reported_at' in record:
-                text += f"Incident Reported At: {record['incident_reported_at']}\n"
-            
-            # Add action information
-            if 'action_taken_by' in record and record['action_taken_by']:
-                text += f"Action Taken By: {record['action_taken_by']}\n"
-            if 'action_date_time' in record and record['action_date_time']:
-                text += f"Action Date/Time: {record['action_date_time']}\n"
-            if 'action_remarks' in record and record['action_remarks']:
-                text += f"Action Remarks: {record['action_remarks']}\n"
-            if 'time_taken_to_take_action' in record and record['time_taken_to_take_action']:
-                text += f"Time Taken to Take Action: {record['time_taken_to_take_action']}\n"
-            
-            # Add closing information
-            if 'closed_by_officer' in record and record['closed_by_officer']:
-                text += f"Closed By: {record['closed_by_officer']}\n"
-            if 'closed_at' in record and record['closed_at']:
-                text += f"Closed At: {record['closed_at']}\n"
-            if 'closed_remarks' in record and record['closed_remarks']:
-                text += f"Closed Remarks: {record['closed_remarks']}\n"
-            if 'time_taken_to_close' in record and record['time_taken_to_close']:
-                text += f"Time Taken to Close: {record['time_taken_to_close']}\n"
-            
-            # Add source information
-            if 'info_source' in record and record['info_source']:
-                text += f"Information Source: {record['info_source']}\n"
-            if 'info_phone' in record and record['info_phone']:
-                text += f"Information Phone: {record['info_phone']}\n"
-            
-            # Add calculated fields if available
-            if 'action_time_hours' in record and record['action_time_hours'] is not None:
-                text += f"Action Time (hours): {record.get('action_time_hours', 'Unknown')}\n"
-            if 'resolution_time_hours' in record and record['resolution_time_hours'] is not None:
-                text += f"Resolution Time (hours): {record.get('resolution_time_hours', 'Unknown')}\n"
-                
-            # Split the text into chunks
-            doc_chunks = text_splitter.create_documents([text], [{"source": i, "record": record}])
-            
-            # Add chunks to the list
-            for chunk in doc_chunks:
-                self.chunks.append({
-                    "text": chunk.page_content,
-                    "metadata": chunk.metadata
-                })
-        
-        print(f"Created {len(self.chunks)} chunks from {len(self.data)} records")
+        print(f"Created {len(self.chunks)} chunks from {self.num_records} records")
         return self.chunks
     
     def initialize_embedding_model(self):
@@ -120,14 +225,10 @@ class TextProcessor:
         Initialize the embedding model.
         
         Returns:
-            HuggingFaceEmbeddings: Initialized embedding model
+            QuantizedEmbedder or SentenceTransformer: Initialized embedding model
         """
         print("Initializing embedding model...")
-        self.embedding_model = HuggingFaceEmbeddings(
-            model_name="all-MiniLM-L6-v2",
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
-        )
+        self.embedding_model = load_embedding_model()
         print("Embedding model initialized")
         return self.embedding_model
     
@@ -145,9 +246,23 @@ class TextProcessor:
             self.initialize_embedding_model()
             
         print("Generating embeddings...")
-        texts = [chunk["text"] for chunk in self.chunks]
-        self.embeddings = self.embedding_model.embed_documents(texts)
-        print(f"Generated {len(self.embeddings)} embeddings")
+        texts = np.array([chunk["text"] for chunk in self.chunks], dtype=object)
+        
+        # Many records share identical boilerplate chunks, so only encode each
+        # distinct text once and scatter the results back to every chunk
+        unique_texts, inverse = np.unique(texts, return_inverse=True)
+        
+        # Encode everything in one call so the model runs full batches, and keep
+        # the result as the float32 matrix FAISS expects
+        unique_embeddings = self.embedding_model.encode(
+            unique_texts.tolist(),
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        ).astype('float32', copy=False)
+        self.embeddings = unique_embeddings[inverse.reshape(-1)]
+        print(f"Generated {len(self.embeddings)} embeddings ({len(unique_texts)} unique texts)")
         return self.embeddings
     
     def create_faiss_index(self):
@@ -161,9 +276,17 @@ class TextProcessor:
             self.generate_embeddings()
             
         print("Creating FAISS index...")
-        embedding_dim = len(self.embeddings[0])
-        index = faiss.IndexFlatL2(embedding_dim)
-        index.add(np.array(self.embeddings).astype('float32'))
+        embedding_dim = self.embeddings.shape[1]
+        
+        # Graph-based ANN search instead of scanning every vector per query. The
+        # embeddings are unit-normalized, so inner product is cosine similarity.
+        # Vectors are stored as fp16, halving index memory and bytes read per probe
+        index = faiss.IndexHNSWSQ(
+            embedding_dim, faiss.ScalarQuantizer.QT_fp16, HNSW_M, faiss.METRIC_INNER_PRODUCT
+        )
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.train(self.embeddings)
+        index.add(self.embeddings)
         self.vector_store = index
         print(f"Created FAISS index with {index.ntotal} vectors of dimension {embedding_dim}")
         return index
@@ -181,15 +304,33 @@ class TextProcessor:
         # Create directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
         
-        # Save chunks
-        chunks_path = os.path.join(output_dir, "chunks.json")
-        with open(chunks_path, 'w') as f:
-            json.dump(self.chunks, f)
-        print(f"Saved chunks to {chunks_path}")
+        # The retriever memory-maps these files, so each is written to a temporary
+        # path and swapped in afterwards; rewriting them in place would truncate
+        # the mapping of a running server
+        chunks_path = os.path.join(output_dir, "chunks.jsonl")
+        offsets_path = os.path.join(output_dir, "chunks.idx")
+        index_path = os.path.join(output_dir, "faiss_index.bin")
+        
+        # Save chunks one JSON object per line, with the byte offset of every line
+        # (plus the end of file) so the retriever can parse single chunks on demand
+        offsets = np.zeros(len(self.chunks) + 1, dtype=np.uint64)
+        with open(chunks_path + ".tmp", 'wb') as f:
+            for i, chunk in enumerate(self.chunks):
+                line = orjson.dumps(chunk, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE)
+                f.write(line)
+                offsets[i + 1] = offsets[i] + len(line)
+        
+        with open(offsets_path + ".tmp", 'wb') as f:
+            np.save(f, offsets)
         
         # Save FAISS index
-        index_path = os.path.join(output_dir, "faiss_index.bin")
-        faiss.write_index(self.vector_store, index_path)
+        faiss.write_index(self.vector_store, index_path + ".tmp")
+        
+        # Swap all three in only once they are complete, so chunk ids and index
+        # ids come from the same build
+        for path in (chunks_path, offsets_path, index_path):
+            os.replace(path + ".tmp", path)
+        print(f"Saved chunks to {chunks_path}")
         print(f"Saved FAISS index to {index_path}")
         
         # Save metadata about the embeddings
@@ -198,12 +339,12 @@ class TextProcessor:
             "chunk_size": self.chunk_size,
             "chunk_overlap": self.chunk_overlap,
             "num_chunks": len(self.chunks),
-            "embedding_dim": len(self.embeddings[0]) if self.embeddings else None
+            "embedding_dim": self.embeddings.shape[1] if self.embeddings is not None else None
         }
         
         metadata_path = os.path.join(output_dir, "embedding_metadata.json")
-        with open(metadata_path, 'w') as f:
-            json.dump(metadata, f)
+        with open(metadata_path, 'wb') as f:
+            f.write(orjson.dumps(metadata))
         print(f"Saved embedding metadata to {metadata_path}")
 
 # Example usage
@@ -215,14 +356,15 @@ if __name__ == "__main__":
     data_dir = os.path.join(os.path.dirname(current_dir), "data")
     
     # Define paths
-    json_path = os.path.join(data_dir, "processed_incidents.json")
+    data_path = os.path.join(data_dir, "processed_incidents.feather")
+    if not os.path.exists(data_path):
+        data_path = os.path.join(data_dir, "processed_incidents.json")
     output_dir = os.path.join(data_dir, "vector_store")
     
     # Create an instance of TextProcessor
-    processor = TextProcessor(json_path)
+    processor = TextProcessor(data_path)
     
-    # Process the data
-    processor.load_data()
+    # Process the data, streaming records from disk while chunking
     processor.create_chunks()
     processor.initialize_embedding_model()
     processor.generate_embeddings()